@@ -1,6 +1,7 @@
 import random
 
-from typing import List
+from bisect import bisect_right
+from typing import Dict, FrozenSet, List, Set, Tuple
 
 class Minesweeper():
     """
@@ -22,13 +23,11 @@ class Minesweeper():
                 row.append(False)
             self.board.append(row)
 
-        # Add mines randomly
-        while len(self.mines) != mines:
-            i = random.randrange(height)
-            j = random.randrange(width)
-            if not self.board[i][j]:
-                self.mines.add((i, j))
-                self.board[i][j] = True
+        # Add mines randomly, drawing distinct positions in a single pass
+        for position in random.sample(range(height * width), mines):
+            i, j = divmod(position, width)
+            self.mines.add((i, j))
+            self.board[i][j] = True
 
         # At first, player has found no mines
         self.mines_found = set()
@@ -59,23 +58,15 @@ class Minesweeper():
         not including the cell itself.
         """
 
-        # Keep count of nearby mines
-        count = 0
-
-        # Loop over all cells within one row and column
-        for i in range(cell[0] - 1, cell[0] + 2):
-            for j in range(cell[1] - 1, cell[1] + 2):
-
-                # Ignore the cell itself
-                if (i, j) == cell:
-                    continue
-
-                # Update count if cell in bounds and is mine
-                if 0 <= i < self.height and 0 <= j < self.width:
-                    if self.board[i][j]:
-                        count += 1
+        i, j = cell
 
-        return count
+        # Sum the rows of the 3x3 window, clamped to the board edges,
+        # then take the cell itself back out of the count
+        count = sum(
+            sum(row[max(0, j - 1):j + 2])
+            for row in self.board[max(0, i - 1):i + 2]
+        )
+        return count - self.board[i][j]
 
     def won(self):
         """
@@ -84,6 +75,58 @@ class Minesweeper():
         return self.mines_found == self.mines
 
 
+def _mask_cells(mask, bit_cells):
+    """
+    Returns the set of cells whose bits are set in `mask`, where
+    `bit_cells` holds the cell of each bit.
+    """
+    cells = set()
+    while mask:
+        low = mask & -mask
+        cells.add(bit_cells[low.bit_length() - 1])
+        mask ^= low
+    return cells
+
+
+def _mask_first_cell(mask, bit_cells):
+    """
+    Returns the cell of the lowest bit set in `mask`, or None if it is 0.
+    """
+    if not mask:
+        return None
+    return bit_cells[(mask & -mask).bit_length() - 1]
+
+
+def _infer_new_sentences(masks, counts, sizes):
+    """
+    Returns the (mask, count) of every sentence inferred from a pair of
+    sentences where one is a strict subset of the other.
+
+    `masks`, `counts` and `sizes` describe the knowledge base sorted by
+    size, the number of cells in each sentence.
+
+    It only does integer arithmetic on plain lists, so it could be compiled
+    later, but it is meant to stay plain Python for now: this project has no
+    Numba or Cython dependency, and the knowledge bases are small.
+    """
+    inferred = []
+    for i, small in enumerate(masks):
+        # Equal sized sentences are skipped by starting at the first
+        # strictly larger one
+        start = bisect_right(sizes, sizes[i], i + 1)
+        for j in range(start, len(masks)):
+            large = masks[j]
+            if small & large != small:
+                continue
+
+            # A negative count can only come from inconsistent knowledge,
+            # so it is dropped before anything is built from it
+            count = counts[j] - counts[i]
+            if count >= 0:
+                inferred.append((large & ~small, count))
+    return inferred
+
+
 class Sentence():
     """
     Logical statement about a Minesweeper game
@@ -91,15 +134,34 @@ class Sentence():
     and a count of the number of those cells which are mines.
     """
 
-    def __init__(self, cells, count):
+    def __init__(self, cells, count, cell_bits=None):
         self.cells = set(cells)
         self.count = count
 
+        # Same cells as a bitmask over the board's `cell_bits` map, for
+        # cheap subset tests. Sentences built without a map have no mask
+        self._cell_bits = cell_bits
+        self.mask = None
+        if cell_bits is not None:
+            self.mask = 0
+            for cell in self.cells:
+                self.mask |= cell_bits[cell]
+
+        # Hash is cached until the cells change
+        self._hash = None
+
     def __eq__(self, other):
-        return self.cells == other.cells and self.count == other.count
+        # Scalar checks first, so most unequal sentences skip the set compare
+        return (
+            self.count == other.count and
+            len(self.cells) == len(other.cells) and
+            self.cells == other.cells
+        )
     
     def __hash__(self):
-        return hash((frozenset(self.cells), self.count))
+        if self._hash is None:
+            self._hash = hash((frozenset(self.cells), self.count))
+        return self._hash
 
     def __str__(self):
         return f"{self.cells} = {self.count}"
@@ -128,7 +190,10 @@ class Sentence():
         """
         if cell in self.cells:
             self.cells.remove(cell)
+            if self.mask is not None:
+                self.mask &= ~self._cell_bits[cell]
             self.count -= 1
+            self._hash = None
 
     def mark_safe(self, cell):
         """
@@ -138,6 +203,9 @@ class Sentence():
         if cell in self.cells:
         
             self.cells.remove(cell)
+            if self.mask is not None:
+                self.mask &= ~self._cell_bits[cell]
+            self._hash = None
 
         
             
@@ -161,17 +229,65 @@ class MinesweeperAI():
         self.mines = set()
         self.safes = set()
 
+        # Same cells as bitmasks, for cheap set algebra when picking moves
+        self._moves_mask = 0
+        self._mines_mask = 0
+        self._safes_mask = 0
+
         # List of sentences about the game known to be true
         self.knowledge : List[Sentence] = []
 
+        # Same sentences as a set, for fast membership tests
+        self._knowledge_set : Set[Sentence] = set()
+
+        # Whether some sentence of the knowledge base has no cells left
+        self._has_empty = False
+
+        # Sentences of the knowledge base indexed by the cells they hold
+        self._by_cell : Dict[Tuple[int, int], List[Sentence]] = {}
+
+        # Bit standing for each board cell in a cells mask, in row-major
+        # order, and the cell of each bit. Sentences built by the AI use it
+        self._cell_bits : Dict[Tuple[int, int], int] = {}
+        self._bit_cells : List[Tuple[int, int]] = []
+        for i in range(height):
+            for j in range(width):
+                self._cell_bits[(i, j)] = 1 << len(self._bit_cells)
+                self._bit_cells.append((i, j))
+
+        # Every cell of the board as a bitmask
+        self._all_mask = (1 << len(self._bit_cells)) - 1
+
+        # Neighbors of every cell, computed once for the whole board
+        self._neighbors : Dict[Tuple[int, int], FrozenSet[Tuple[int, int]]] = {
+            (i, j): frozenset(
+                (i + di, j + dj)
+                for di in (-1, 0, 1)
+                for dj in (-1, 0, 1)
+                if (di or dj)
+                and 0 <= i + di < height
+                and 0 <= j + dj < width
+            )
+            for i in range(height)
+            for j in range(width)
+        }
+
     def mark_mine(self, cell):
         """
         Marks a cell as a mine, and updates all knowledge
         to mark that cell as a mine as well.
         """
         self.mines.add(cell)
-        for sentence in self.knowledge:
+        self._mines_mask |= self._cell_bits[cell]
+        for sentence in self._by_cell.pop(cell, ()):
+            # Its hash changes with its cells, so take it out of the set
+            # while it is updated
+            self._knowledge_set.discard(sentence)
             sentence.mark_mine(cell)
+            if sentence.cells:
+                self._knowledge_set.add(sentence)
+            else:
+                self._has_empty = True
 
     def mark_safe(self, cell):
         """
@@ -179,8 +295,16 @@ class MinesweeperAI():
         to mark that cell as safe as well.
         """
         self.safes.add(cell)
-        for sentence in self.knowledge:
+        self._safes_mask |= self._cell_bits[cell]
+        for sentence in self._by_cell.pop(cell, ()):
+            # Its hash changes with its cells, so take it out of the set
+            # while it is updated
+            self._knowledge_set.discard(sentence)
             sentence.mark_safe(cell)
+            if sentence.cells:
+                self._knowledge_set.add(sentence)
+            else:
+                self._has_empty = True
 
     def add_knowledge(self, cell, count):
         """
@@ -199,104 +323,101 @@ class MinesweeperAI():
         """
         "1)"
         self.moves_made.add(cell)
+        self._moves_mask |= self._cell_bits[cell]
 
         "2)"
+        # Only the sentences holding the cell are changed by marking it
+        touched = self._by_cell.get(cell, [])
         self.mark_safe(cell)
 
         "3)"
-        self.addNewStement(cell, count)
+        sentence0 = self.addNewStement(cell, count)
 
         "4)"
-        self.update_knowledge()
+        self.update_knowledge(seed=touched + [sentence0])
 
         "5)"
-        self.checkNewStement()
-        self.update_knowledge()
+        new = self.checkNewStement()
+        self.update_knowledge(seed=new)
         
 
             
     def checkNewStement(self):
+        # A strict subset is always smaller, so the inference only needs
+        # the sentences sorted by size
+        sortedKnowledge = sorted(self.knowledge, key=lambda s: len(s.cells))
+        inferred = _infer_new_sentences(
+            [sentence.mask for sentence in sortedKnowledge],
+            [sentence.count for sentence in sortedKnowledge],
+            [len(sentence.cells) for sentence in sortedKnowledge]
+        )
+
         new_statements = []
-        
-        for i, sentence in enumerate(self.knowledge):
-            for j, sentenceC in enumerate(self.knowledge):
-                if i != j and sentence.cells.issubset(sentenceC.cells):
-                    difSentenceCells = sentenceC.cells - sentence.cells
-                    difSentenceCount = sentenceC.count - sentence.count
-                    new_sentence = Sentence(
-                          cells= difSentenceCells,
-                          count= difSentenceCount  
-                        )
-                    
-                    
-                    if difSentenceCount >= 0:
-                        new_sentence = Sentence(
-                          cells=difSentenceCells,
-                          count=difSentenceCount  
-                        )
-                    
-                    if (new_sentence not in new_statements and
-                        new_sentence not in self.knowledge):
-                        new_statements.append(new_sentence)
-                        
-                    
-        self.knowledge.extend(new_statements)
+        for mask, count in set(inferred):
+            new_sentence = Sentence(
+                _mask_cells(mask, self._bit_cells),
+                count,
+                self._cell_bits
+            )
+            if new_sentence not in self._knowledge_set:
+                new_statements.append(new_sentence)
+
+        for new_sentence in new_statements:
+            self._add_sentence(new_sentence)
+        return new_statements
        
-    def update_knowledge(self):
-        change = True
-        while change:
+    def update_knowledge(self, seed=None):
+        # Sentences that may lead to new conclusions, at first the `seed`
+        # sentences or, without one, the whole knowledge base
+        pending = self.knowledge if seed is None else seed
+        while pending:
             safes = set()
             mines = set()
-            change = False
-            for sentence in self.knowledge:
-                safes = safes.union(sentence.known_safes())
-                mines = mines.union(sentence.known_mines())
-
-            newSafes = safes - self.safes
-        if newSafes:
-            change = True
-            for safe in newSafes:
+            for sentence in pending:
+                safes |= sentence.known_safes()
+                mines |= sentence.known_mines()
+
+            # Only sentences holding a newly marked cell can change, so
+            # those are the only ones to look at again
+            pending = []
+            for safe in safes - self.safes:
+                pending.extend(self._by_cell.get(safe, ()))
                 self.mark_safe(safe)
-        
-        # Marcar novas minas
-        newMines = mines - self.mines
-        if newMines:
-            change = True
-            for mine in newMines:
+
+            # Marcar novas minas
+            for mine in mines - self.mines:
+                pending.extend(self._by_cell.get(mine, ()))
                 self.mark_mine(mine)
-        self.knowledge = [sentence for sentence in self.knowledge if len(sentence.cells) > 0]
+
+        # Drop sentences left without cells, if marking emptied any
+        if self._has_empty:
+            self.knowledge = [sentence for sentence in self.knowledge if len(sentence.cells) > 0]
+            self._has_empty = False
     
     def addNewStement(self, cell, count):
         "new sentence to the AI's knowledge base on the value of `cell` and `count`"
-        i, j = cell
-        cellsNewStement = set()
-        for di in range(-1,2):
-            for dj in range(-1,2):
-                #to dont add the current cells
-                if di == 0 and dj == 0:
-                    continue
-
-                #to dont add already know as safe
-                if (i + di,j + dj) in self.safes:
-                    continue
-
-                #to dont add already know as mine, and reduce de count -1
-                if (i + di,j + dj) in self.mines:
-                    count-=1
-                    continue
-
-                #check if current cell in grid
-                if(
-                    (i+di) >= 0 and (i+di) < self.width and
-                    (j+dj) >= 0 and (j+dj) < self.height
-                   ):  
-                    dcell = (i+di,j+dj)
-                    cellsNewStement.add(dcell)
-        
+        neighbors = self._neighbors[cell]
+
+        #skip cells already known as safe or mine, and discount known mines
+        cellsNewStement = neighbors - self.safes - self.mines
+        count -= len(neighbors & self.mines)
+
         sentence0 = Sentence(
                 cellsNewStement,
-                count)
-        self.knowledge.append(sentence0)
+                count,
+                self._cell_bits)
+        self._add_sentence(sentence0)
+        return sentence0
+
+    def _add_sentence(self, sentence):
+        "append `sentence` to the knowledge base and index it by its cells"
+        self.knowledge.append(sentence)
+        if sentence.cells:
+            self._knowledge_set.add(sentence)
+        else:
+            self._has_empty = True
+        for cell in sentence.cells:
+            self._by_cell.setdefault(cell, []).append(sentence)
 
               
 
@@ -310,13 +431,8 @@ class MinesweeperAI():
         and self.moves_made, but should not modify any of those values.
         """
 
-        move = self.safes - self.moves_made -self.mines
-        if len(move) > 0:
-            move = next(iter(move))
- 
-            return move
-
-        return None
+        move = self._safes_mask & ~self._moves_mask & ~self._mines_mask
+        return _mask_first_cell(move, self._bit_cells)
 
     def make_random_move(self):
         """
@@ -325,14 +441,7 @@ class MinesweeperAI():
             1) have not already been chosen, and
             2) are not known to be mines
         """
-        allcells = set()
-        for i in range(0,self.width):
-            for j in range(0,self.height):
-                allcells.add((i,j))
-        move = (allcells - self.mines) - self.moves_made
-        
-        if len(move) > 0:
-            move = next(iter(move))
-            return move
-
-        return None
+        move = self._all_mask & ~self._mines_mask & ~self._moves_mask
+        if not move:
+            return None
+        return random.choice(sorted(_mask_cells(move, self._bit_cells)))